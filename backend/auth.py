@@ -5,34 +5,108 @@ This module handles user authentication, password management,
 JWT token generation/validation, and security-related operations.
 """
 
+import asyncio
 import logging
+import os
 import secrets
 import hashlib
+import hmac
 import io
 import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Union
 
+import orjson
 import pyotp
 import qrcode
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from itsdangerous import URLSafeTimedSerializer
-from jose import JWTError, jwt
+import jwt
+from jwt import PyJWTError as JWTError
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete, case, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 from config import settings
 from database import get_db
-from models import User, RefreshToken, PasswordHistory, EmailVerification, PasswordReset
+from models import User, RefreshToken, PasswordHistory, EmailVerification, PasswordReset, utcnow
 
 logger = logging.getLogger(__name__)
 
 # Authentication utilities
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=settings.bcrypt_rounds, deprecated="auto")
 security = HTTPBearer()
 serializer = URLSafeTimedSerializer(settings.secret_key)
 
+# Settings used on every request, bound once at import
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TTL = timedelta(minutes=settings.access_token_expire_minutes)
+REFRESH_TTL = timedelta(days=settings.refresh_token_expire_days)
+EMAIL_VERIFICATION_TTL = timedelta(hours=24)
+PASSWORD_RESET_TTL = timedelta(hours=1)
+MAX_LOGIN_ATTEMPTS = settings.max_login_attempts
+LOCKOUT_TD = timedelta(minutes=settings.lockout_duration_minutes)
+PASSWORD_HISTORY_COUNT = settings.password_history_count
+
+# HMAC-based JWTs are signed with a keyed hash state built once at import, since the
+# secret never changes at runtime. Other algorithms go through jwt.encode.
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+if ALGORITHM in _HMAC_DIGESTS:
+    _jwt_signer = hmac.new(SECRET_KEY.encode(), digestmod=_HMAC_DIGESTS[ALGORITHM])
+    _jwt_header_segment = _b64url(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"}))
+else:
+    _jwt_signer = None
+    _jwt_header_segment = None
+
+# Verified access token payloads keyed by SHA-256 of the raw token.
+# Only successful verifications are cached; entries never outlive the token's own expiry.
+_jwt_cache = TTLCache(maxsize=settings.jwt_cache_maxsize, ttl=settings.jwt_cache_ttl_seconds)
+_jwt_cache_lock = threading.RLock()
+
+# Column snapshots of authenticated users keyed by user id, so hot users skip the
+# per-request SELECT. Entries are dropped whenever login or password state changes.
+_user_cache = TTLCache(maxsize=settings.user_cache_maxsize, ttl=settings.user_cache_ttl_seconds)
+_user_cache_lock = threading.Lock()
+
+# Credential and lockout state is never snapshotted. Invalidation only reaches this
+# process, so these columns load fresh (in one SELECT) whenever a request reads them,
+# and a password change or lockout takes effect on every worker immediately.
+_UNCACHED_USER_COLUMNS = frozenset({"hashed_password", "failed_login_attempts", "locked_until"})
+
+# User ids keyed by email, so repeated lookups by email reuse the snapshots above.
+# Emails never change, so only the snapshot needs invalidating on writes.
+_user_email_cache = TTLCache(maxsize=settings.user_cache_maxsize, ttl=settings.user_email_cache_ttl_seconds)
+
+# bcrypt releases the GIL, so hashes verified on this pool run in parallel
+_bcrypt_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="bcrypt")
+
+# Verified against when the email is unknown, so missing users cost the same bcrypt work
+_dummy_password_hash = pwd_context.hash(secrets.token_urlsafe(32))
+
+def hash_token(token: str) -> bytes:
+    """
+    Hash an opaque token for storage and lookup.
+    
+    Args:
+        token: The raw token handed to the client
+        
+    Returns:
+        bytes: The 32-byte SHA-256 digest of the token
+    """
+    return hashlib.sha256(token.encode()).digest()
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a plain password against its hash.
@@ -47,7 +121,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
-        logger.error(f"Password verification error: {e}")
+        logger.error("Password verification error: %s", e)
         return False
 
 
@@ -64,6 +138,35 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password on the bcrypt thread pool without blocking the event loop.
+    
+    Args:
+        plain_password: The plain text password
+        hashed_password: The hashed password to verify against
+        
+    Returns:
+        bool: True if password matches, False otherwise
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_pool, verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash a password on the bcrypt thread pool without blocking the event loop.
+    
+    Args:
+        password: The plain text password to hash
+        
+    Returns:
+        str: The hashed password
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_pool, get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token.
@@ -76,25 +179,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         str: The encoded JWT token
     """
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(
-            minutes=settings.access_token_expire_minutes
-        )
+        expire = now + ACCESS_TTL
     
     to_encode.update({
-        "exp": expire,
-        "iat": datetime.now(timezone.utc).timestamp(),
+        "exp": int(expire.timestamp()),
+        "iat": int(now.timestamp()),
         "type": "access"
     })
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
-    return encoded_jwt
+    
+    if _jwt_signer is None:
+        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    
+    payload_segment = _b64url(orjson.dumps(to_encode))
+    signing_input = _jwt_header_segment + b"." + payload_segment
+    signer = _jwt_signer.copy()
+    signer.update(signing_input)
+    return (signing_input + b"." + _b64url(signer.digest())).decode()
 
 def create_refresh_token(user_id: int, db: Session, request: Request = None) -> str:
     token = secrets.token_urlsafe(32)
-    expires_at = datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days)
+    expires_at = datetime.now(timezone.utc) + REFRESH_TTL
     
     ip_address = None
     user_agent = None
@@ -104,7 +213,7 @@ def create_refresh_token(user_id: int, db: Session, request: Request = None) ->
     
     try:
         db_refresh_token = RefreshToken(
-            token=token,
+            token_hash=hash_token(token),
             user_id=user_id,
             expires_at=expires_at,
             ip_address=ip_address,
@@ -114,16 +223,29 @@ def create_refresh_token(user_id: int, db: Session, request: Request = None) ->
         db.commit()
         return token
     except Exception as e:
-        logger.error(f"Error creating refresh token: {e}")
+        logger.error("Error creating refresh token: %s", e)
         db.rollback()
         raise
 
 def verify_token(token: str) -> Optional[dict]:
+    key = hash_token(token)
+    
+    with _jwt_cache_lock:
+        payload = _jwt_cache.get(key)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return payload
+        with _jwt_cache_lock:
+            _jwt_cache.pop(key, None)
+    
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        return payload
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+    
+    with _jwt_cache_lock:
+        _jwt_cache[key] = payload
+    return payload
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
@@ -132,67 +254,176 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+def invalidate_user_cache(user_id: int) -> None:
+    """Drop the cached snapshot of a user whose stored state has changed"""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+def _snapshot_user(user: User) -> dict:
+    """Copy the loaded column values of a user for the snapshot cache"""
+    # Deferred and uncached columns stay out of the snapshot and load on access
+    return {
+        attr.key: getattr(user, attr.key)
+        for attr in User.__mapper__.column_attrs
+        if not attr.deferred and attr.key not in _UNCACHED_USER_COLUMNS
+    }
+
+def get_cached_user_by_id(db: Session, user_id: int) -> Optional[User]:
+    """Get a user by id, serving hot users from the in-memory snapshot cache"""
+    with _user_cache_lock:
+        snapshot = _user_cache.get(user_id)
+    
+    if snapshot is not None:
+        # Rebuild a clean persistent instance without touching the database
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
+    
+    user = get_user_by_id(db, user_id)
+    if user is not None:
+        snapshot = _snapshot_user(user)
+        with _user_cache_lock:
+            _user_cache[user_id] = snapshot
+    return user
+
+def get_cached_user_by_email(db: Session, email: str) -> Optional[User]:
+    """Get a user by email through the id cache and the user snapshot cache"""
+    with _user_cache_lock:
+        user_id = _user_email_cache.get(email)
+    
+    if user_id is not None:
+        return get_cached_user_by_id(db, user_id)
+    
     user = get_user_by_email(db, email)
-    if not user or not verify_password(password, user.hashed_password):
+    if user is not None:
+        snapshot = _snapshot_user(user)
+        with _user_cache_lock:
+            _user_email_cache[email] = user.id
+            _user_cache[user.id] = snapshot
+    return user
+
+def load_credential_columns(db: Session, user: User) -> User:
+    """Load the uncached credential columns of a user in one SELECT"""
+    # Done up front so code running on the event loop never lazy loads them
+    unloaded = _UNCACHED_USER_COLUMNS & inspect(user).unloaded
+    if unloaded:
+        db.refresh(user, attribute_names=list(unloaded))
+    return user
+
+async def authenticate_user_with_row(user: Optional[User], password: str) -> Optional[User]:
+    """Check a password against a user row the caller has already fetched"""
+    if not user:
+        await verify_password_async(password, _dummy_password_hash)
+        return None
+    # Locked accounts are rejected before paying for bcrypt
+    if is_account_locked(user):
+        return None
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
-def check_password_history(db: Session, user_id: int, new_password: str) -> bool:
+def get_password_history_hashes(db: Session, user_id: int) -> List[str]:
+    """Get the hashes of the user's most recent passwords"""
+    return db.execute(
+        select(PasswordHistory.hashed_password)
+        .where(PasswordHistory.user_id == user_id)
+        .order_by(PasswordHistory.created_at.desc())
+        .limit(PASSWORD_HISTORY_COUNT)
+    ).scalars().all()
+
+async def check_password_history(db: Session, user_id: int, new_password: str) -> bool:
     """Check if password was used recently"""
-    password_history = db.query(PasswordHistory).filter(
+    history_hashes = await run_in_threadpool(get_password_history_hashes, db, user_id)
+    
+    matches = await asyncio.gather(*(
+        verify_password_async(new_password, hashed_password)
+        for hashed_password in history_hashes
+    ))
+    return not any(matches)
+
+def _record_password_history(db: Session, user_id: int, hashed_password: str):
+    """Insert a password history row and trim old ones, without committing"""
+    db.execute(insert(PasswordHistory).values(user_id=user_id, hashed_password=hashed_password))
+    
+    # Clean old password history in a single DELETE
+    recent_ids = select(PasswordHistory.id).where(
         PasswordHistory.user_id == user_id
-    ).order_by(PasswordHistory.created_at.desc()).limit(settings.password_history_count).all()
+    ).order_by(PasswordHistory.created_at.desc()).limit(PASSWORD_HISTORY_COUNT)
     
-    for old_password in password_history:
-        if verify_password(new_password, old_password.hashed_password):
-            return False
-    return True
+    db.execute(
+        delete(PasswordHistory).where(
+            PasswordHistory.user_id == user_id,
+            PasswordHistory.id.notin_(recent_ids)
+        ),
+        execution_options={"synchronize_session": False}
+    )
 
 def add_password_to_history(db: Session, user_id: int, hashed_password: str):
     """Add password to history and clean old ones"""
     try:
-        password_entry = PasswordHistory(
-            user_id=user_id,
-            hashed_password=hashed_password
-        )
-        db.add(password_entry)
-        
-        # Clean old password history
-        old_passwords = db.query(PasswordHistory).filter(
-            PasswordHistory.user_id == user_id
-        ).order_by(PasswordHistory.created_at.desc()).offset(settings.password_history_count).all()
-        
-        for old_password in old_passwords:
-            db.delete(old_password)
-        
+        _record_password_history(db, user_id, hashed_password)
         db.commit()
     except Exception as e:
-        logger.error(f"Error adding password to history: {e}")
+        logger.error("Error adding password to history: %s", e)
         db.rollback()
         raise
 
+def update_user_password(db: Session, user_id: int, hashed_password: str):
+    """
+    Stage a password change and its history entry in the current transaction.
+    
+    The caller commits, so related writes (such as consuming a reset token)
+    land in the same transaction.
+    """
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(hashed_password=hashed_password, password_changed_at=utcnow()),
+        execution_options={"synchronize_session": False}
+    )
+    _record_password_history(db, user_id, hashed_password)
+
 def is_account_locked(user: User) -> bool:
     """Check if account is locked due to failed login attempts"""
-    if user.locked_until and user.locked_until > datetime.now(timezone.utc):
-        return True
-    return False
+    locked_until = user.locked_until
+    if not locked_until:
+        return False
+    if locked_until.tzinfo is None:
+        # SQLite returns naive datetimes; stored values are UTC
+        locked_until = locked_until.replace(tzinfo=timezone.utc)
+    return locked_until > datetime.now(timezone.utc)
 
 def increment_failed_login(db: Session, user: User):
     """Increment failed login attempts and lock account if necessary"""
-    user.failed_login_attempts += 1
-    
-    if user.failed_login_attempts >= settings.max_login_attempts:
-        user.locked_until = datetime.now(timezone.utc) + timedelta(minutes=settings.lockout_duration_minutes)
-    
+    # Counted in SQL so concurrent failures cannot overwrite each other's increment
+    attempts = User.failed_login_attempts + 1
+    db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(
+            failed_login_attempts=attempts,
+            locked_until=case(
+                (attempts >= MAX_LOGIN_ATTEMPTS, datetime.now(timezone.utc) + LOCKOUT_TD),
+                else_=User.locked_until
+            )
+        ),
+        execution_options={"synchronize_session": False}
+    )
     db.commit()
+    invalidate_user_cache(user.id)
 
 def reset_failed_login_attempts(db: Session, user: User):
     """Reset failed login attempts after successful login"""
-    user.failed_login_attempts = 0
-    user.locked_until = None
-    user.last_login_at = datetime.now(timezone.utc)
+    # One UPDATE instead of loading and flushing the ORM row
+    db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(failed_login_attempts=0, locked_until=None, last_login_at=utcnow()),
+        execution_options={"synchronize_session": False}
+    )
     db.commit()
+    invalidate_user_cache(user.id)
 
 def generate_verification_token(user_id: int) -> str:
     """Generate email verification token"""
@@ -209,11 +440,11 @@ def verify_verification_token(token: str, max_age: int = 3600) -> Optional[int]:
 def create_email_verification(db: Session, user_id: int) -> str:
     """Create email verification record"""
     token = generate_verification_token(user_id)
-    expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
+    expires_at = datetime.now(timezone.utc) + EMAIL_VERIFICATION_TTL
     
     verification = EmailVerification(
         user_id=user_id,
-        token=token,
+        token_hash=hash_token(token),
         expires_at=expires_at
     )
     db.add(verification)
@@ -224,11 +455,11 @@ def create_email_verification(db: Session, user_id: int) -> str:
 def create_password_reset(db: Session, user_id: int) -> str:
     """Create password reset record"""
     token = secrets.token_urlsafe(32)
-    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    expires_at = datetime.now(timezone.utc) + PASSWORD_RESET_TTL
     
     reset = PasswordReset(
         user_id=user_id,
-        token=token,
+        token_hash=hash_token(token),
         expires_at=expires_at
     )
     db.add(reset)
@@ -236,9 +467,7 @@ def create_password_reset(db: Session, user_id: int) -> str:
     
     return token
 
-def create_user(db: Session, email: str, first_name: str, last_name: str, password: str) -> User:
-    hashed_password = get_password_hash(password)
-    
+def create_user(db: Session, email: str, first_name: str, last_name: str, hashed_password: str) -> User:
     try:
         db_user = User(
             email=email,
@@ -248,18 +477,17 @@ def create_user(db: Session, email: str, first_name: str, last_name: str, passwo
         )
         db.add(db_user)
         db.commit()
-        db.refresh(db_user)
         
         # Add initial password to history
         add_password_to_history(db, db_user.id, hashed_password)
         
         return db_user
     except Exception as e:
-        logger.error(f"Error creating user: {e}")
+        logger.error("Error creating user: %s", e)
         db.rollback()
         raise
 
-async def get_current_user(
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
@@ -273,32 +501,41 @@ async def get_current_user(
     if payload is None:
         raise credentials_exception
     
-    user_id: int = payload.get("sub")
-    if user_id is None:
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
         raise credentials_exception
     
-    user = get_user_by_id(db, user_id=user_id)
+    user = get_cached_user_by_id(db, user_id=user_id)
     if user is None:
         raise credentials_exception
     
     return user
 
-def verify_refresh_token(db: Session, token: str) -> Optional[User]:
-    db_token = db.query(RefreshToken).filter(
-        RefreshToken.token == token,
-        RefreshToken.revoked == False,
-        RefreshToken.expires_at > datetime.now(timezone.utc)
-    ).first()
-    
-    if not db_token:
-        return None
+def consume_refresh_token(db: Session, token: str) -> Optional[int]:
+    """Revoke a valid refresh token for rotation and return its user id.
     
-    return db_token.user
+    The check and the revocation are one UPDATE, so a token can only be
+    rotated once. The caller commits.
+    """
+    return db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == hash_token(token),
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > datetime.now(timezone.utc)
+        )
+        .values(revoked=True)
+        .returning(RefreshToken.user_id),
+        execution_options={"synchronize_session": False}
+    ).scalar_one_or_none()
 
 def revoke_refresh_token(db: Session, token: str) -> bool:
-    db_token = db.query(RefreshToken).filter(RefreshToken.token == token).first()
+    token_hash = hash_token(token)
+    db_token = db.query(RefreshToken).filter(RefreshToken.token_hash == token_hash).first()
     if db_token:
         db_token.revoked = True
         db.commit()
+        invalidate_user_cache(db_token.user_id)
         return True
     return False
\ No newline at end of file
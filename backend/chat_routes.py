@@ -1,10 +1,12 @@
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, func
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import desc, func, select
 from typing import List, Optional
 from datetime import datetime, timezone
 
-from database import get_db
+from database import get_db, SessionLocal
 from auth import get_current_user
 from models import User, Chat, Message, ChatSettings, AIMode, MessageRole
 from schemas import (
@@ -15,8 +17,17 @@ from schemas import (
 
 router = APIRouter(prefix="/api/chats", tags=["chats"])
 
+# Messages fetched and serialized per chunk when streaming a chat
+MESSAGE_STREAM_BATCH_SIZE = 500
+
+# Handlers here only do blocking database work, so they are plain functions that
+# FastAPI runs in its threadpool instead of on the event loop.
+
+# Responses are built with model_construct: the values come from typed ORM columns
+# and FastAPI validates the declared response_model on the way out anyway.
+
 @router.post("/", response_model=ChatResponse, status_code=status.HTTP_201_CREATED)
-async def create_chat(
+def create_chat(
     chat_data: ChatCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -28,22 +39,21 @@ async def create_chat(
     )
     db.add(db_chat)
     db.commit()
-    db.refresh(db_chat)
     
-    return ChatResponse(
+    return ChatResponse.model_construct(
         id=db_chat.id,
         user_id=db_chat.user_id,
         title=db_chat.title,
-        mode=db_chat.mode.value,
+        mode=db_chat.mode,
         is_pinned=db_chat.is_pinned,
         is_archived=db_chat.is_archived,
         created_at=db_chat.created_at,
         updated_at=db_chat.updated_at,
-        message_count=0
+        message_count=db_chat.message_count
     )
 
 @router.get("/", response_model=List[ChatResponse])
-async def get_chats(
+def get_chats(
     mode: Optional[AIModeEnum] = None,
     include_archived: bool = False,
     limit: int = Query(50, ge=1, le=100),
@@ -54,7 +64,7 @@ async def get_chats(
     query = db.query(Chat).filter(Chat.user_id == current_user.id)
     
     if mode:
-        query = query.filter(Chat.mode == AIMode(mode))
+        query = query.filter(Chat.mode == AIMode(mode).value)
     
     if not include_archived:
         query = query.filter(Chat.is_archived == False)
@@ -63,75 +73,69 @@ async def get_chats(
     query = query.order_by(desc(Chat.is_pinned), desc(Chat.updated_at))
     
     chats = query.offset(offset).limit(limit).all()
-    
-    # Optimize database queries using subqueries
     chat_ids = [chat.id for chat in chats]
     
-    # Get message counts for all chats in one query
-    message_counts = dict(
-        db.query(Message.chat_id, func.count(Message.id))
-        .filter(Message.chat_id.in_(chat_ids))
-        .group_by(Message.chat_id)
-        .all()
-    ) if chat_ids else {}
-    
-    # Get last messages for all chats in one query using a subquery
-    last_messages_subq = (
-        db.query(Message.chat_id, func.max(Message.created_at).label('max_created_at'))
-        .filter(Message.chat_id.in_(chat_ids))
-        .group_by(Message.chat_id)
-        .subquery()
-    ) if chat_ids else None
-    
+    # Get the newest message of every chat in one query using a window function
     last_messages = {}
-    if last_messages_subq is not None:
+    if chat_ids:
+        ranked = (
+            db.query(
+                Message.id,
+                func.row_number().over(
+                    partition_by=Message.chat_id,
+                    order_by=(desc(Message.created_at), desc(Message.id))
+                ).label("rank")
+            )
+            .filter(Message.chat_id.in_(chat_ids))
+            .subquery()
+        )
         last_messages_query = (
             db.query(Message)
-            .join(last_messages_subq, 
-                  (Message.chat_id == last_messages_subq.c.chat_id) & 
-                  (Message.created_at == last_messages_subq.c.max_created_at))
+            .join(ranked, Message.id == ranked.c.id)
+            .filter(ranked.c.rank == 1)
         ).all()
         last_messages = {msg.chat_id: msg for msg in last_messages_query}
     
     # Build chat responses efficiently
     chat_responses = []
     for chat in chats:
-        message_count = message_counts.get(chat.id, 0)
         last_message = last_messages.get(chat.id)
         
         last_message_response = None
         if last_message:
-            last_message_response = MessageResponse(
+            last_message_response = MessageResponse.model_construct(
                 id=last_message.id,
                 chat_id=last_message.chat_id,
-                role=last_message.role.value,
+                role=last_message.role,
                 content=last_message.content,
                 message_metadata=last_message.message_metadata,
                 created_at=last_message.created_at
             )
         
-        chat_responses.append(ChatResponse(
+        chat_responses.append(ChatResponse.model_construct(
             id=chat.id,
             user_id=chat.user_id,
             title=chat.title,
-            mode=chat.mode.value,
+            mode=chat.mode,
             is_pinned=chat.is_pinned,
             is_archived=chat.is_archived,
             created_at=chat.created_at,
             updated_at=chat.updated_at,
-            message_count=message_count,
+            message_count=chat.message_count,
             last_message=last_message_response
         ))
     
     return chat_responses
 
 @router.get("/{chat_id}", response_model=ChatDetailResponse)
-async def get_chat(
+def get_chat(
     chat_id: int,
+    limit: int = Query(200, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    chat = db.query(Chat).options(joinedload(Chat.messages)).filter(
+    chat = db.query(Chat).filter(
         Chat.id == chat_id,
         Chat.user_id == current_user.id
     ).first()
@@ -142,32 +146,74 @@ async def get_chat(
             detail="Chat not found"
         )
     
-    messages = [
-        MessageResponse(
-            id=msg.id,
-            chat_id=msg.chat_id,
-            role=msg.role.value,
-            content=msg.content,
-            message_metadata=msg.message_metadata,
-            created_at=msg.created_at
-        ) for msg in chat.messages
-    ]
-    
-    return ChatDetailResponse(
-        id=chat.id,
-        user_id=chat.user_id,
-        title=chat.title,
-        mode=chat.mode.value,
-        is_pinned=chat.is_pinned,
-        is_archived=chat.is_archived,
-        created_at=chat.created_at,
-        updated_at=chat.updated_at,
-        message_count=len(messages),
-        messages=messages
+    # Select plain rows rather than hydrating ORM Message objects. The page is
+    # counted back from the newest message, then returned oldest first.
+    page = (
+        select(
+            Message.id,
+            Message.chat_id,
+            Message.role,
+            Message.content,
+            Message.message_metadata,
+            Message.created_at
+        )
+        .where(Message.chat_id == chat_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .offset(offset)
+        .limit(limit)
+        .subquery()
     )
+    messages_query = (
+        select(page)
+        .order_by(page.c.created_at, page.c.id)
+        .execution_options(yield_per=MESSAGE_STREAM_BATCH_SIZE)
+    )
+    
+    chat_fields = orjson.dumps({
+        "id": chat.id,
+        "user_id": chat.user_id,
+        "title": chat.title,
+        "mode": chat.mode,
+        "is_pinned": chat.is_pinned,
+        "is_archived": chat.is_archived,
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+        "message_count": chat.message_count,
+        "last_message": None,
+    })
+    
+    def stream_chat():
+        # Same JSON as ChatDetailResponse, written out one batch of messages at a time.
+        # The body is sent after the handler returns, so the stream reads through
+        # its own session rather than the request's.
+        stream_db = SessionLocal()
+        try:
+            yield chat_fields[:-1] + b',"messages":['
+            separator = b""
+            for batch in stream_db.execute(messages_query).partitions():
+                yield separator + b",".join(
+                    orjson.dumps({
+                        "id": row.id,
+                        "chat_id": row.chat_id,
+                        "role": row.role,
+                        "content": row.content,
+                        "message_metadata": row.message_metadata,
+                        "created_at": row.created_at,
+                    })
+                    for row in batch
+                )
+                separator = b","
+            yield b"]}"
+        finally:
+            stream_db.close()
+    
+    # Release the request session's connection now instead of at dependency
+    # teardown, so the stream does not hold two pooled connections.
+    db.close()
+    return StreamingResponse(stream_chat(), media_type="application/json")
 
 @router.put("/{chat_id}", response_model=ChatResponse)
-async def update_chat(
+def update_chat(
     chat_id: int,
     chat_data: ChatUpdate,
     db: Session = Depends(get_db),
@@ -188,27 +234,22 @@ async def update_chat(
     for key, value in update_data.items():
         setattr(chat, key, value)
     
-    chat.updated_at = datetime.now(timezone.utc)
     db.commit()
-    db.refresh(chat)
-    
-    # Get message count efficiently
-    message_count = db.query(func.count(Message.id)).filter(Message.chat_id == chat.id).scalar() or 0
     
-    return ChatResponse(
+    return ChatResponse.model_construct(
         id=chat.id,
         user_id=chat.user_id,
         title=chat.title,
-        mode=chat.mode.value,
+        mode=chat.mode,
         is_pinned=chat.is_pinned,
         is_archived=chat.is_archived,
         created_at=chat.created_at,
         updated_at=chat.updated_at,
-        message_count=message_count
+        message_count=chat.message_count
     )
 
 @router.delete("/{chat_id}")
-async def delete_chat(
+def delete_chat(
     chat_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -230,7 +271,7 @@ async def delete_chat(
     return {"message": "Chat deleted successfully"}
 
 @router.post("/{chat_id}/messages", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
-async def create_message(
+def create_message(
     chat_id: int,
     message_data: MessageCreate,
     db: Session = Depends(get_db),
@@ -255,23 +296,22 @@ async def create_message(
     )
     db.add(db_message)
     
-    # Update chat's updated_at timestamp
-    chat.updated_at = datetime.now(timezone.utc)
+    # Bump the message count in the same transaction; the UPDATE also refreshes updated_at
+    chat.message_count = Chat.message_count + 1
     
     db.commit()
-    db.refresh(db_message)
     
-    return MessageResponse(
+    return MessageResponse.model_construct(
         id=db_message.id,
         chat_id=db_message.chat_id,
-        role=db_message.role.value,
+        role=db_message.role,
         content=db_message.content,
         message_metadata=db_message.message_metadata,
         created_at=db_message.created_at
     )
 
 @router.get("/{chat_id}/messages", response_model=List[MessageResponse])
-async def get_messages(
+def get_messages(
     chat_id: int,
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
@@ -294,10 +334,10 @@ async def get_messages(
     ).offset(offset).limit(limit).all()
     
     return [
-        MessageResponse(
+        MessageResponse.model_construct(
             id=msg.id,
             chat_id=msg.chat_id,
-            role=msg.role.value,
+            role=msg.role,
             content=msg.content,
             message_metadata=msg.message_metadata,
             created_at=msg.created_at
@@ -306,7 +346,7 @@ async def get_messages(
 
 # Chat Settings endpoints
 @router.post("/settings", response_model=ChatSettingsResponse, status_code=status.HTTP_201_CREATED)
-async def create_chat_settings(
+def create_chat_settings(
     settings_data: ChatSettingsCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -314,7 +354,7 @@ async def create_chat_settings(
     # Check if settings already exist for this mode
     existing_settings = db.query(ChatSettings).filter(
         ChatSettings.user_id == current_user.id,
-        ChatSettings.mode == AIMode(settings_data.mode)
+        ChatSettings.mode == AIMode(settings_data.mode).value
     ).first()
     
     if existing_settings:
@@ -330,26 +370,25 @@ async def create_chat_settings(
     )
     db.add(db_settings)
     db.commit()
-    db.refresh(db_settings)
     
     return ChatSettingsResponse(
         id=db_settings.id,
         user_id=db_settings.user_id,
-        mode=db_settings.mode.value,
+        mode=db_settings.mode,
         settings=db_settings.settings,
         created_at=db_settings.created_at,
         updated_at=db_settings.updated_at
     )
 
 @router.get("/settings/{mode}", response_model=ChatSettingsResponse)
-async def get_chat_settings(
+def get_chat_settings(
     mode: AIModeEnum,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     settings = db.query(ChatSettings).filter(
         ChatSettings.user_id == current_user.id,
-        ChatSettings.mode == AIMode(mode)
+        ChatSettings.mode == AIMode(mode).value
     ).first()
     
     if not settings:
@@ -367,26 +406,27 @@ async def get_chat_settings(
             }
         }
         
+        now = datetime.now(timezone.utc)
         return ChatSettingsResponse(
             id=0,
             user_id=current_user.id,
             mode=mode,
             settings=default_settings.get(mode, {}),
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc)
+            created_at=now,
+            updated_at=now
         )
     
     return ChatSettingsResponse(
         id=settings.id,
         user_id=settings.user_id,
-        mode=settings.mode.value,
+        mode=settings.mode,
         settings=settings.settings,
         created_at=settings.created_at,
         updated_at=settings.updated_at
     )
 
 @router.put("/settings/{mode}", response_model=ChatSettingsResponse)
-async def update_chat_settings(
+def update_chat_settings(
     mode: AIModeEnum,
     settings_data: ChatSettingsUpdate,
     db: Session = Depends(get_db),
@@ -394,7 +434,7 @@ async def update_chat_settings(
 ):
     settings = db.query(ChatSettings).filter(
         ChatSettings.user_id == current_user.id,
-        ChatSettings.mode == AIMode(mode)
+        ChatSettings.mode == AIMode(mode).value
     ).first()
     
     if not settings:
@@ -407,15 +447,13 @@ async def update_chat_settings(
         db.add(settings)
     else:
         settings.settings = settings_data.settings
-        settings.updated_at = datetime.now(timezone.utc)
     
     db.commit()
-    db.refresh(settings)
     
     return ChatSettingsResponse(
         id=settings.id,
         user_id=settings.user_id,
-        mode=settings.mode.value,
+        mode=settings.mode,
         settings=settings.settings,
         created_at=settings.created_at,
         updated_at=settings.updated_at
@@ -6,9 +6,12 @@ and application settings in a centralized manner.
 """
 
 import os
+import atexit
+import queue
 import logging
 import logging.config
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Union
 from pydantic_settings import BaseSettings
 from pydantic import Field, validator
 
@@ -23,6 +26,42 @@ class Settings(BaseSettings):
         description="Database connection URL"
     )
     
+    db_pool_size: int = Field(
+        default=20,
+        env="DB_POOL_SIZE",
+        description="Number of persistent database connections per worker"
+    )
+    
+    db_max_overflow: int = Field(
+        default=40,
+        env="DB_MAX_OVERFLOW",
+        description="Extra connections allowed beyond the pool size under load"
+    )
+    
+    db_pool_timeout: int = Field(
+        default=5,
+        env="DB_POOL_TIMEOUT",
+        description="Seconds to wait for a free pooled connection"
+    )
+    
+    db_pool_recycle: int = Field(
+        default=1800,
+        env="DB_POOL_RECYCLE",
+        description="Seconds after which pooled connections are recreated"
+    )
+    
+    db_pool_pre_ping: bool = Field(
+        default=False,
+        env="DB_POOL_PRE_PING",
+        description="Test connections with a round trip on every checkout"
+    )
+    
+    auto_create_tables: bool = Field(
+        default=False,
+        env="AUTO_CREATE_TABLES",
+        description="Create missing tables on startup in production (always done in other environments)"
+    )
+    
     # Security
     secret_key: str = Field(
         ...,
@@ -67,6 +106,70 @@ class Settings(BaseSettings):
         description="Number of previous passwords to remember"
     )
     
+    bcrypt_rounds: int = Field(
+        default=12,
+        env="BCRYPT_ROUNDS",
+        description="bcrypt cost factor (lower values only for development and tests)"
+    )
+    
+    forgot_password_min_response_ms: int = Field(
+        default=250,
+        env="FORGOT_PASSWORD_MIN_RESPONSE_MS",
+        description="Minimum forgot-password response time, so known and unknown emails take equally long"
+    )
+    
+    # Caching
+    jwt_cache_maxsize: int = Field(
+        default=10000,
+        env="JWT_CACHE_MAXSIZE",
+        description="Maximum number of verified access tokens kept in memory"
+    )
+    
+    jwt_cache_ttl_seconds: int = Field(
+        default=10,
+        env="JWT_CACHE_TTL_SECONDS",
+        description="Lifetime of a cached access token verification in seconds"
+    )
+    
+    user_cache_maxsize: int = Field(
+        default=5000,
+        env="USER_CACHE_MAXSIZE",
+        description="Maximum number of authenticated users kept in memory"
+    )
+    
+    user_cache_ttl_seconds: int = Field(
+        default=30,
+        env="USER_CACHE_TTL_SECONDS",
+        description="Lifetime of a cached authenticated user in seconds"
+    )
+    
+    user_email_cache_ttl_seconds: int = Field(
+        default=10,
+        env="USER_EMAIL_CACHE_TTL_SECONDS",
+        description="Lifetime of a cached email to user id mapping in seconds"
+    )
+    
+    # Rate limiting
+    rate_limit_per_second: float = Field(
+        default=20.0,
+        gt=0,
+        env="RATE_LIMIT_PER_SECOND",
+        description="Sustained requests per second allowed per client IP"
+    )
+    
+    rate_limit_burst: int = Field(
+        default=40,
+        ge=1,
+        env="RATE_LIMIT_BURST",
+        description="Requests a client IP may burst above the sustained rate"
+    )
+    
+    rate_limit_storage_uri: str = Field(
+        default="memory://",
+        env="RATE_LIMIT_STORAGE_URI",
+        description="Storage for per-endpoint auth limits; use redis:// to share them across workers"
+    )
+    
     # Application
     debug: bool = Field(
         default=False,
@@ -86,13 +189,28 @@ class Settings(BaseSettings):
         description="Logging level"
     )
     
+    workers: Optional[int] = Field(
+        default=None,
+        env="WORKERS",
+        description="Uvicorn worker processes when not in debug mode (defaults to the CPU count)"
+    )
+    
     # CORS
-    allowed_origins: list[str] = Field(
+    # Union with str lets comma-separated env values reach the validators below
+    # instead of failing JSON decoding in the settings source
+    allowed_origins: Union[list[str], str] = Field(
         default=["http://localhost:3000", "http://localhost:3001"],
         env="ALLOWED_ORIGINS",
         description="Allowed CORS origins"
     )
     
+    # Trusted hosts
+    allowed_hosts: Union[list[str], str] = Field(
+        default=[],
+        env="ALLOWED_HOSTS",
+        description="Host headers accepted in production (e.g. api.example.com,*.example.com)"
+    )
+    
     @validator('allowed_origins', pre=True)
     def parse_origins(cls, v):
         if isinstance(v, str):
@@ -100,6 +218,12 @@ class Settings(BaseSettings):
             return origins if origins else ["http://localhost:3000"]
         return v if v else ["http://localhost:3000"]
     
+    @validator('allowed_hosts', pre=True)
+    def parse_hosts(cls, v):
+        if isinstance(v, str):
+            return [host.strip() for host in v.split(',') if host.strip()]
+        return v or []
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -131,7 +255,7 @@ def setup_logging(log_level: str = "INFO", log_format: Optional[str] = None) ->
             "detailed": {
                 "format": (
                     "%(asctime)s - %(name)s - %(levelname)s - "
-                    "%(pathname)s:%(lineno)d - %(funcName)s() - %(message)s"
+                    "%(filename)s:%(lineno)d - %(message)s"
                 ),
                 "datefmt": "%Y-%m-%d %H:%M:%S",
             },
@@ -170,7 +294,7 @@ def setup_logging(log_level: str = "INFO", log_format: Optional[str] = None) ->
                 "propagate": False,
             },
             "sqlalchemy.engine": {
-                "handlers": ["file"],
+                "handlers": ["console"],
                 "level": "WARNING",
                 "propagate": False,
             },
@@ -181,6 +305,15 @@ def setup_logging(log_level: str = "INFO", log_format: Optional[str] = None) ->
     os.makedirs("logs", exist_ok=True)
     
     logging.config.dictConfig(logging_config)
+    
+    # Root handlers run on a background listener thread; callers only enqueue records,
+    # so console and file I/O never blocks a request
+    root_logger = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+    root_logger.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    atexit.register(listener.stop)
 
 
 # Create settings instance
@@ -191,4 +324,4 @@ setup_logging(settings.log_level)
 
 # Get logger
 logger = logging.getLogger(__name__)
-logger.info(f"Application started with environment: {settings.environment}")
\ No newline at end of file
+logger.info("Application started with environment: %s", settings.environment)
\ No newline at end of file
@@ -7,38 +7,69 @@ and provides database dependency injection for FastAPI.
 
 import logging
 from typing import Generator
-from sqlalchemy import create_engine, Engine
+from sqlalchemy import create_engine, event, Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Applied to every new SQLite connection: WAL lets readers run alongside the writer,
+# and synchronous=NORMAL is durable under WAL while skipping most fsyncs
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",  # 256MB
+    "cache_size=-64000",    # 64MB
+    "foreign_keys=ON",
+)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Configure a freshly opened SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {pragma}")
+    finally:
+        cursor.close()
+
 # Database engine configuration
 def create_database_engine() -> Engine:
     """Create and configure the database engine."""
     connect_args = {}
+    pool_args = {}
     
     if settings.database_url.startswith("sqlite"):
         connect_args["check_same_thread"] = False
         logger.info("Using SQLite database")
     else:
+        # Size the pool for per-request DB work instead of SQLAlchemy's 5/10 defaults
+        pool_args["pool_size"] = settings.db_pool_size
+        pool_args["max_overflow"] = settings.db_max_overflow
+        pool_args["pool_timeout"] = settings.db_pool_timeout
         logger.info("Using PostgreSQL database")
     
     engine = create_engine(
         settings.database_url,
         connect_args=connect_args,
         echo=settings.debug,  # Log SQL queries in debug mode
-        pool_pre_ping=True,   # Verify connections before use
-        pool_recycle=300,     # Recreate connections after 5 minutes
+        pool_pre_ping=settings.db_pool_pre_ping,  # Extra round trip per checkout when enabled
+        pool_recycle=settings.db_pool_recycle,    # Recreate connections periodically
+        **pool_args,
     )
     
-    logger.info(f"Database engine created successfully")
+    if settings.database_url.startswith("sqlite"):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    
+    logger.info("Database engine created successfully")
     return engine
 
 # Create engine and session factory
 engine = create_database_engine()
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects keep their loaded state after commit; values generated by the database
+# come back through RETURNING (see eager_defaults on the models) instead of a reload
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create declarative base for models
 Base = declarative_base()
@@ -57,7 +88,7 @@ def get_db() -> Generator[Session, None, None]:
     try:
         yield db
     except Exception as e:
-        logger.error(f"Database session error: {e}")
+        logger.error("Database session error: %s", e)
         db.rollback()
         raise
     finally:
@@ -5,28 +5,42 @@ A professional FastAPI application for user authentication,
 chat management, and AI-powered interactions.
 """
 
+import asyncio
 import logging
+import math
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from typing import AsyncGenerator
 
-from fastapi import FastAPI, Request, HTTPException
+import orjson
+from fastapi import FastAPI, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from fastapi.responses import ORJSONResponse
+from fastapi.utils import is_body_allowed_for_status_code
 from slowapi.errors import RateLimitExceeded
+from sqlalchemy import text
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from config import settings
 from database import engine, Base
-from routes import router as auth_router
+from middleware import ErrorASGIMiddleware, TokenBucketMiddleware
+from routes import router as auth_router, limiter
 from chat_routes import router as chat_router
 
 logger = logging.getLogger(__name__)
 
-# Rate limiting
-limiter = Limiter(key_func=get_remote_address)
+# Database probe used by /health
+_HEALTH_PING = text("SELECT 1")
+HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
+
+# Formatted /health timestamp as [monotonic time of formatting, ISO string];
+# frequent probes within the TTL reuse the string
+HEALTH_TIMESTAMP_TTL_SECONDS = 0.25
+_health_timestamp = [float("-inf"), ""]
 
 
 @asynccontextmanager
@@ -39,13 +53,14 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Startup
     logger.info("Starting LLM_MODES Backend Application...")
     
-    # Create database tables
-    try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
-    except Exception as e:
-        logger.error(f"Failed to create database tables: {e}")
-        raise
+    # Create database tables; production schemas are managed by the migration scripts
+    if settings.environment != "production" or settings.auto_create_tables:
+        try:
+            Base.metadata.create_all(bind=engine)
+            logger.info("Database tables created successfully")
+        except Exception as e:
+            logger.error("Failed to create database tables: %s", e)
+            raise
     
     logger.info("Application startup complete")
     
@@ -56,6 +71,73 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     logger.info("Application shutdown complete")
 
 
+async def http_exception_handler(request: Request, exc: StarletteHTTPException) -> Response:
+    """
+    Render HTTP errors with orjson, matching FastAPI's default error body.
+    
+    Args:
+        request: The FastAPI request object
+        exc: The HTTP exception that was raised
+        
+    Returns:
+        Response: Error response
+    """
+    headers = getattr(exc, "headers", None)
+    if not is_body_allowed_for_status_code(exc.status_code):
+        return Response(status_code=exc.status_code, headers=headers)
+    return ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=headers)
+
+
+async def validation_exception_handler(request: Request, exc: RequestValidationError) -> ORJSONResponse:
+    """
+    Render request validation errors with orjson, matching FastAPI's default error body.
+    
+    The rejected input is left out of each error, since for auth requests it is
+    a password (or the whole body, for model-level errors). Password mismatches
+    are raised by a model-level validator and are reported on confirm_password.
+    
+    Args:
+        request: The FastAPI request object
+        exc: The validation error that was raised
+        
+    Returns:
+        ORJSONResponse: Error response
+    """
+    errors = []
+    for error in exc.errors():
+        error = {key: value for key, value in error.items() if key != "input"}
+        if error["type"] == "password_mismatch":
+            error["loc"] = (*error["loc"], "confirm_password")
+        errors.append(error)
+    return ORJSONResponse({"detail": jsonable_encoder(errors)}, status_code=422)
+
+
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> ORJSONResponse:
+    """
+    Render per-route limit errors like the token bucket's 429, with Retry-After.
+    
+    Args:
+        request: The FastAPI request object
+        exc: The limit error raised by the slowapi decorator
+        
+    Returns:
+        ORJSONResponse: Error response
+    """
+    limiter = request.app.state.limiter
+    try:
+        limit, args = request.state.view_rate_limit
+        reset_at, _ = limiter.limiter.get_window_stats(limit, *args)
+        retry_after = max(1, math.ceil(reset_at - time.time()))
+    except Exception:
+        # Storage unreachable; the full window is always long enough
+        retry_after = exc.limit.limit.get_expiry()
+    return ORJSONResponse(
+        {"detail": f"Rate limit exceeded: {exc.detail}"},
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
 def create_application() -> FastAPI:
     """
     Create and configure the FastAPI application.
@@ -70,20 +152,34 @@ def create_application() -> FastAPI:
         docs_url="/docs" if settings.debug else None,
         redoc_url="/redoc" if settings.debug else None,
         openapi_url="/openapi.json" if settings.debug else None,
+        default_response_class=ORJSONResponse,
         lifespan=lifespan,
     )
     
-    # Add rate limiting
+    # Error responses use the same serializer as everything else
+    app.add_exception_handler(StarletteHTTPException, http_exception_handler)
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    
+    # Per-route limits from the slowapi decorators in routes
     app.state.limiter = limiter
-    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+    app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+    
+    # Add rate limiting
+    app.add_middleware(
+        TokenBucketMiddleware,
+        rate=settings.rate_limit_per_second,
+        capacity=settings.rate_limit_burst,
+    )
     
     # Add security middleware
     if settings.environment == "production":
-        # TODO: Configure with actual production domains
-        app.add_middleware(
-            TrustedHostMiddleware,
-            allowed_hosts=["your-domain.com", "*.your-domain.com"]
-        )
+        if settings.allowed_hosts:
+            app.add_middleware(
+                TrustedHostMiddleware,
+                allowed_hosts=settings.allowed_hosts
+            )
+        else:
+            logger.warning("ALLOWED_HOSTS is not set; Host headers are not validated")
     
     # Add CORS middleware
     app.add_middleware(
@@ -91,10 +187,13 @@ def create_application() -> FastAPI:
         allow_origins=settings.allowed_origins,
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        allow_headers=["*"],
-        expose_headers=["*"],
+        # Explicit list: preflights get a fixed header value instead of echoing the request
+        allow_headers=["Authorization", "Content-Type", "X-Requested-With"],
     )
     
+    # Outermost, so unhandled exceptions from any layer become a JSON 500
+    app.add_middleware(ErrorASGIMiddleware)
+    
     # Include routers
     app.include_router(auth_router, tags=["Authentication"])
     app.include_router(chat_router, tags=["Chat"])
@@ -106,83 +205,91 @@ def create_application() -> FastAPI:
 app = create_application()
 
 
+# The root payload never changes while the process runs, so it is serialized once
+_ROOT_BYTES = orjson.dumps({
+    "status": "healthy",
+    "message": "LLM_MODES Backend API",
+    "version": "1.0.0",
+    "environment": settings.environment,
+})
+
+
 @app.get("/", tags=["Health"])
-async def root() -> dict:
+async def root() -> Response:
     """
     Root endpoint for health check.
     
     Returns:
-        dict: Application status and information
+        Response: Pre-serialized application status and information
     """
-    return {
-        "status": "healthy",
-        "message": "LLM_MODES Backend API",
-        "version": "1.0.0",
-        "environment": settings.environment,
-    }
+    return Response(content=_ROOT_BYTES, media_type="application/json")
+
+
+def _health_timestamp_now() -> str:
+    """Return the current UTC time in ISO format, reformatted at most every TTL."""
+    now = time.monotonic()
+    if now - _health_timestamp[0] > HEALTH_TIMESTAMP_TTL_SECONDS:
+        _health_timestamp[0] = now
+        _health_timestamp[1] = datetime.now(timezone.utc).isoformat()
+    return _health_timestamp[1]
+
+
+def _probe_database() -> None:
+    """Run a trivial query on a pooled connection, without an ORM session."""
+    with engine.connect() as connection:
+        connection.execute(_HEALTH_PING)
 
 
 @app.get("/health", tags=["Health"])
-async def health_check() -> dict:
+async def health_check() -> ORJSONResponse:
     """
     Detailed health check endpoint.
     
+    The database probe runs in a worker thread with a timeout, so a stalled
+    database cannot block the event loop.
+    
     Returns:
-        dict: Detailed health information
+        ORJSONResponse: Detailed health information, with status 503 when unhealthy
     """
     try:
-        # Test database connection
-        from database import SessionLocal
-        from sqlalchemy import text
-        db = SessionLocal()
-        try:
-            db.execute(text("SELECT 1"))
-            db_status = "healthy"
-        finally:
-            db.close()
+        await asyncio.wait_for(
+            asyncio.to_thread(_probe_database),
+            timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
+        )
+        db_status = "healthy"
     except Exception as e:
-        logger.error(f"Database health check failed: {e}")
+        logger.error("Database health check failed: %r", e)
         db_status = "unhealthy"
     
-    return {
-        "status": "healthy" if db_status == "healthy" else "unhealthy",
-        "checks": {
-            "database": db_status,
-        },
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-    }
-
-
-@app.exception_handler(Exception)
-async def global_exception_handler(request: Request, exc: Exception) -> JSONResponse:
-    """
-    Global exception handler for unhandled errors.
-    
-    Args:
-        request: The FastAPI request object
-        exc: The exception that occurred
-        
-    Returns:
-        JSONResponse: Error response
-    """
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    
-    return JSONResponse(
-        status_code=500,
+    healthy = db_status == "healthy"
+    return ORJSONResponse(
+        status_code=200 if healthy else 503,
         content={
-            "error": "Internal server error",
-            "message": "An unexpected error occurred",
-        }
+            "status": "healthy" if healthy else "unhealthy",
+            "checks": {
+                "database": db_status,
+            },
+            "timestamp": _health_timestamp_now(),
+        },
     )
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
     
+    # Reload and multiple workers are mutually exclusive in uvicorn
+    workers = 1 if settings.debug else (settings.workers or os.cpu_count() or 1)
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=settings.debug,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        proxy_headers=True,
         log_level=settings.log_level.lower(),
     )
\ No newline at end of file
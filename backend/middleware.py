@@ -0,0 +1,109 @@
+"""
+ASGI middleware for LLM_MODES backend.
+
+The middleware here is written against the raw ASGI interface rather than
+Starlette's BaseHTTPMiddleware, so requests pass straight through without
+an extra task or Request/Response objects on the happy path.
+"""
+
+import logging
+import math
+import time
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED_BODY = b'{"detail":"Rate limit exceeded"}'
+INTERNAL_ERROR_BODY = b'{"error":"Internal server error","message":"An unexpected error occurred"}'
+
+
+class ErrorASGIMiddleware:
+    """
+    Translate unhandled exceptions into a JSON 500 response.
+
+    Exceptions raised after the response has started cannot be replaced,
+    so they are logged and re-raised for the server to abort the connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            logger.error("Unhandled exception: %s", exc, exc_info=True)
+            if response_started:
+                raise
+            await send({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(INTERNAL_ERROR_BODY)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": INTERNAL_ERROR_BODY})
+
+
+class TokenBucketMiddleware:
+    """
+    Per-client token bucket rate limiter.
+
+    Every client IP starts with ``capacity`` tokens, which refill at ``rate``
+    tokens per second. Each HTTP request spends one token; requests arriving
+    with an empty bucket get a 429 response without reaching the application.
+    """
+
+    def __init__(self, app, rate: float, capacity: int, max_clients: int = 100000):
+        self.app = app
+        self.rate = rate
+        self.capacity = capacity
+        # A bucket left idle until it is full again is indistinguishable from a new
+        # one, so entries can expire after that long without changing any decision
+        self.buckets = TTLCache(maxsize=max_clients, ttl=capacity / rate)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Behind a proxy, run uvicorn with proxy_headers so this is the real client
+        client = scope.get("client")
+        key = client[0] if client else ""
+        now = time.monotonic()
+
+        # No await between reading and writing the bucket, so this is race-free on the loop
+        tokens, last = self.buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) * self.rate)
+
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            retry_after = math.ceil((1 - tokens) / self.rate)
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(RATE_LIMITED_BODY)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": RATE_LIMITED_BODY})
+            return
+
+        self.buckets[key] = (tokens - 1, now)
+        await self.app(scope, receive, send)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Migration script to store chat modes and message roles as plain strings
+Run this script after updating your models.py file
+
+SQLAlchemy's Enum type stored the member names (e.g. SIMILAR_QUESTIONS);
+the String columns store the member values (e.g. similar_questions).
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text, inspect
+from database import engine
+from models import AIMode, MessageRole
+
+# (table, column, enum class, PostgreSQL enum type created by the old column)
+ENUM_COLUMNS = [
+    ("chats", "mode", AIMode, "aimode"),
+    ("chat_settings", "mode", AIMode, "aimode"),
+    ("messages", "role", MessageRole, "messagerole"),
+]
+
+def migrate_database():
+    """Convert enum columns to strings holding the enum values"""
+    print("Starting enum column migration...")
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    is_postgresql = engine.dialect.name == "postgresql"
+
+    with engine.connect() as connection:
+        trans = connection.begin()
+
+        try:
+            for table_name, column_name, enum_class, type_name in ENUM_COLUMNS:
+                if table_name not in existing_tables:
+                    continue
+
+                if is_postgresql:
+                    # Native enum types only accept member names, so change the type first
+                    connection.execute(text(
+                        f"ALTER TABLE {table_name} ALTER COLUMN {column_name} "
+                        f"TYPE VARCHAR(32) USING {column_name}::text"
+                    ))
+
+                updated = 0
+                for member in enum_class:
+                    result = connection.execute(
+                        text(f"UPDATE {table_name} SET {column_name} = :value WHERE {column_name} = :name"),
+                        {"value": member.value, "name": member.name}
+                    )
+                    updated += result.rowcount
+                print(f"Converted {updated} rows in {table_name}.{column_name}")
+
+            if is_postgresql:
+                for type_name in {type_name for _, _, _, type_name in ENUM_COLUMNS}:
+                    connection.execute(text(f"DROP TYPE IF EXISTS {type_name}"))
+
+            trans.commit()
+            print("Migration completed successfully!")
+
+        except Exception as e:
+            print(f"Migration failed: {e}")
+            trans.rollback()
+            raise
+
+def main():
+    """Main migration function"""
+    try:
+        migrate_database()
+        print("✅ Database migration completed successfully!")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the indexes declared in models.py on an existing database
+and drop the redundant primary key indexes older versions created
+Run this script after updating your models.py file
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, select, func, text
+from database import engine, Base
+import models  # noqa: F401 - registers all tables on Base.metadata
+
+def has_duplicate_keys(connection, index):
+    """Check whether existing rows would violate a unique index"""
+    columns = list(index.columns)
+    duplicates = select(*columns).group_by(*columns).having(func.count() > 1).limit(1)
+    return connection.execute(duplicates).first() is not None
+
+def migrate_database():
+    """Create every model index that is missing from the database"""
+    print("Starting index migration...")
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.connect() as connection:
+        trans = connection.begin()
+
+        try:
+            for table in Base.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    # Missing tables are created with their indexes on startup
+                    continue
+
+                existing_indexes = {index['name']: index for index in inspector.get_indexes(table.name)}
+
+                # Primary keys are already indexed; the old index=True copy only slows inserts
+                pk_index_name = f"ix_{table.name}_id"
+                if pk_index_name in existing_indexes and pk_index_name not in {index.name for index in table.indexes}:
+                    print(f"Dropping redundant index {pk_index_name} on {table.name}...")
+                    connection.execute(text(f"DROP INDEX {pk_index_name}"))
+
+                for index in table.indexes:
+                    existing = existing_indexes.get(index.name)
+                    if existing is not None and bool(existing['unique']) == bool(index.unique):
+                        continue
+
+                    # Check before touching the old index; SQLite commits DDL immediately
+                    if index.unique and has_duplicate_keys(connection, index):
+                        raise ValueError(
+                            f"Cannot create unique index {index.name}: {table.name} has duplicate rows"
+                        )
+
+                    if existing is not None:
+                        print(f"Recreating index {index.name} on {table.name} as unique={bool(index.unique)}...")
+                        index.drop(bind=connection)
+                    else:
+                        print(f"Creating index {index.name} on {table.name}...")
+                    index.create(bind=connection)
+
+            trans.commit()
+            print("Migration completed successfully!")
+
+        except Exception as e:
+            print(f"Migration failed: {e}")
+            trans.rollback()
+            raise
+
+def main():
+    """Main migration function"""
+    try:
+        migrate_database()
+        print("✅ Database migration completed successfully!")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
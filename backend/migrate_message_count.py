@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the denormalized message_count column to chats
+Run this script after updating your models.py file
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text, inspect
+from database import engine
+
+def migrate_database():
+    """Add chats.message_count and backfill it from existing messages"""
+    print("Starting message count migration...")
+
+    inspector = inspect(engine)
+    if 'chats' not in inspector.get_table_names():
+        print("Table chats not found. It will be created with the updated schema on startup.")
+        return
+
+    existing_columns = {col['name'] for col in inspector.get_columns('chats')}
+
+    with engine.connect() as connection:
+        trans = connection.begin()
+
+        try:
+            if 'message_count' not in existing_columns:
+                print("Adding column message_count to chats table...")
+                connection.execute(text(
+                    "ALTER TABLE chats ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0"
+                ))
+
+            # Backfill counts once; create_message keeps them current afterwards
+            backfill_sql = """
+            UPDATE chats
+            SET message_count = (
+                SELECT COUNT(*) FROM messages WHERE messages.chat_id = chats.id
+            )
+            """
+            result = connection.execute(text(backfill_sql))
+            print(f"Backfilled message counts for {result.rowcount} chats")
+
+            trans.commit()
+            print("Migration completed successfully!")
+
+        except Exception as e:
+            print(f"Migration failed: {e}")
+            trans.rollback()
+            raise
+
+def main():
+    """Main migration function"""
+    try:
+        migrate_database()
+        print("✅ Database migration completed successfully!")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
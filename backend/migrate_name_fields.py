@@ -17,6 +17,7 @@ def migrate_database():
     
     print(f"Starting migration at {datetime.now()}")
     
+    conn = None
     try:
         # Connect to the database
         conn = sqlite3.connect(db_path)
@@ -43,19 +44,26 @@ def migrate_database():
         
         print(f"Adding columns: {migrations_needed}")
         
-        # Add first_name column if it doesn't exist
-        if 'first_name' in migrations_needed:
-            cursor.execute("ALTER TABLE users ADD COLUMN first_name TEXT")
-            print("✅ Added first_name column")
+        # Let readers keep working while the migration writes
+        conn.execute("PRAGMA journal_mode=WAL")
         
-        # Add last_name column if it doesn't exist
-        if 'last_name' in migrations_needed:
-            cursor.execute("ALTER TABLE users ADD COLUMN last_name TEXT")
-            print("✅ Added last_name column")
+        # Run the ALTERs and the backfill as one script in one write transaction
+        script = ["BEGIN IMMEDIATE;"]
+        for column in migrations_needed:
+            script.append(f"ALTER TABLE users ADD COLUMN {column} TEXT;")
+        # Fill placeholder values, keeping whichever name is already set
+        script.append(
+            "UPDATE users SET first_name = COALESCE(first_name, 'User'), last_name = COALESCE(last_name, 'Name') "
+            "WHERE first_name IS NULL OR last_name IS NULL;"
+        )
+        script.append("COMMIT;")
         
-        # Update existing users with placeholder values
-        cursor.execute("UPDATE users SET first_name = 'User', last_name = 'Name' WHERE first_name IS NULL OR last_name IS NULL")
-        updated_rows = cursor.rowcount
+        changes_before = conn.total_changes
+        conn.executescript("\n".join(script))
+        updated_rows = conn.total_changes - changes_before
+        
+        for column in migrations_needed:
+            print(f"✅ Added {column} column")
         
         if updated_rows > 0:
             print(f"✅ Updated {updated_rows} existing users with placeholder names")
@@ -64,8 +72,6 @@ def migrate_database():
         # Note: SQLite doesn't support modifying column constraints directly
         # In a production environment, you'd create a new table and migrate data
         
-        # Commit the changes
-        conn.commit()
         print("✅ Migration completed successfully")
         
         # Verify the migration
@@ -79,7 +85,8 @@ def migrate_database():
         
     except Exception as e:
         print(f"❌ Migration failed: {str(e)}")
-        conn.rollback()
+        if conn:
+            conn.rollback()
         return False
         
     finally:
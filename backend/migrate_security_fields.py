@@ -6,7 +6,6 @@ Run this script after updating your models.py file
 
 import os
 import sys
-from datetime import datetime, timezone
 
 # Add the backend directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -15,21 +14,20 @@ from sqlalchemy import text, inspect
 from database import engine, Base
 from models import User, RefreshToken, PasswordHistory, EmailVerification, PasswordReset
 
-def check_column_exists(table_name, column_name):
-    """Check if a column exists in a table"""
+def get_existing_schema():
+    """Reflect every table's column names once, keyed by table name"""
     inspector = inspect(engine)
-    columns = inspector.get_columns(table_name)
-    return any(col['name'] == column_name for col in columns)
-
-def check_table_exists(table_name):
-    """Check if a table exists"""
-    inspector = inspect(engine)
-    return table_name in inspector.get_table_names()
+    return {
+        table_name: {col['name'] for col in inspector.get_columns(table_name)}
+        for table_name in inspector.get_table_names()
+    }
 
 def migrate_database():
     """Apply security field migrations to existing database"""
     print("Starting security fields migration...")
     
+    existing = get_existing_schema()
+    
     with engine.connect() as connection:
         trans = connection.begin()
         
@@ -47,7 +45,7 @@ def migrate_database():
             ]
             
             for column_name, column_def in user_columns:
-                if not check_column_exists('users', column_name):
+                if column_name not in existing.get('users', set()):
                     print(f"Adding column {column_name} to users table...")
                     connection.execute(text(f"ALTER TABLE users ADD COLUMN {column_name} {column_def}"))
             
@@ -58,7 +56,7 @@ def migrate_database():
             ]
             
             for column_name, column_def in refresh_token_columns:
-                if not check_column_exists('refresh_tokens', column_name):
+                if column_name not in existing.get('refresh_tokens', set()):
                     print(f"Adding column {column_name} to refresh_tokens table...")
                     connection.execute(text(f"ALTER TABLE refresh_tokens ADD COLUMN {column_name} {column_def}"))
             
@@ -98,13 +96,11 @@ def migrate_database():
             ]
             
             for table_name, create_sql in new_tables:
-                if not check_table_exists(table_name):
+                if table_name not in existing:
                     print(f"Creating table {table_name}...")
                     connection.execute(text(create_sql))
             
             # Update existing users with default values for new security fields
-            now = datetime.now(timezone.utc).isoformat()
-            
             # Set password_changed_at to created_at for existing users
             update_sql = """
             UPDATE users 
@@ -115,8 +111,8 @@ def migrate_database():
             
             print("Migration completed successfully!")
             
-            # Create all other tables that might not exist
-            Base.metadata.create_all(bind=engine)
+            # Create all other tables that might not exist, in the same transaction
+            Base.metadata.create_all(bind=connection)
             
             trans.commit()
             
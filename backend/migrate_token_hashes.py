@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Migration script to store refresh, password reset and email verification
+tokens as SHA-256 hashes instead of plaintext
+Run this script after updating your models.py file
+
+PostgreSQL tables are altered in place. SQLite tables are rebuilt, since SQLite
+cannot drop a column that carries a UNIQUE constraint. Other databases are not
+supported.
+"""
+
+import hashlib
+import os
+import sys
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text, inspect, column, String
+from database import engine
+from models import RefreshToken, EmailVerification, PasswordReset
+
+TOKEN_MODELS = [RefreshToken, EmailVerification, PasswordReset]
+
+def migrate_table_in_place(connection, table):
+    """Add a token_hash column, hash existing tokens in SQL and drop the plaintext column"""
+    print(f"Hashing tokens in {table.name} in place...")
+    hash_type = table.c.token_hash.type.compile(dialect=connection.dialect)
+    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN token_hash {hash_type}"))
+
+    # sha256() is built into PostgreSQL 11 and later
+    result = connection.execute(text(
+        f"UPDATE {table.name} SET token_hash = sha256(convert_to(token, 'UTF8'))"
+    ))
+    connection.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN token_hash SET NOT NULL"))
+
+    # Recreate the uniqueness the model declares: a unique index where one is named,
+    # otherwise the unique constraint create_all would have emitted
+    token_hash_indexes = [index for index in table.indexes if 'token_hash' in index.columns]
+    for index in token_hash_indexes:
+        index.create(bind=connection)
+    if not token_hash_indexes:
+        connection.execute(text(
+            f"ALTER TABLE {table.name} ADD CONSTRAINT {table.name}_token_hash_key UNIQUE (token_hash)"
+        ))
+
+    # Dropping the column also drops the indexes and constraints on it
+    connection.execute(text(f"ALTER TABLE {table.name} DROP COLUMN token"))
+    print(f"Hashed {result.rowcount} tokens in {table.name}")
+
+def migrate_table(connection, table, existing_columns, existing_indexes):
+    """Rebuild a token table with a token_hash column, hashing existing tokens (SQLite)"""
+    old_name = f"{table.name}_plaintext"
+    print(f"Rebuilding table {table.name} with hashed tokens...")
+
+    # Index names would clash with the recreated table once the old one is renamed
+    for index_name in existing_indexes:
+        connection.execute(text(f"DROP INDEX {index_name}"))
+
+    # Keep the old rows aside, recreate the table from the model and copy the rows over
+    connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {old_name}"))
+    table.create(bind=connection)
+
+    # Ids are reassigned by the new table; nothing references these rows by id
+    copied_columns = [
+        column.name for column in table.columns
+        if column.name in existing_columns and column.name not in ("id", "token_hash")
+    ]
+    # Type the result columns with the model so values round-trip unchanged
+    select_old = text(f"SELECT token, {', '.join(copied_columns)} FROM {old_name}").columns(
+        column("token", String), *[table.c[name] for name in copied_columns]
+    )
+    rows = connection.execute(select_old).mappings().all()
+
+    if rows:
+        connection.execute(table.insert(), [
+            {
+                "token_hash": hashlib.sha256(row["token"].encode()).digest(),
+                **{name: row[name] for name in copied_columns},
+            }
+            for row in rows
+        ])
+
+    connection.execute(text(f"DROP TABLE {old_name}"))
+    print(f"Hashed {len(rows)} tokens in {table.name}")
+
+def migrate_database():
+    """Convert every plaintext token table to hashed token storage"""
+    print("Starting token hash migration...")
+
+    if engine.dialect.name not in ("postgresql", "sqlite"):
+        raise RuntimeError(f"Token hash migration does not support {engine.dialect.name}")
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.connect() as connection:
+        trans = connection.begin()
+
+        try:
+            for model in TOKEN_MODELS:
+                table = model.__table__
+                if table.name not in existing_tables:
+                    continue
+
+                existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+                if 'token' in existing_columns and 'token_hash' not in existing_columns:
+                    if engine.dialect.name == "postgresql":
+                        # Renaming and recreating the table would collide with the
+                        # <table>_pkey constraint and id sequence the old table keeps
+                        migrate_table_in_place(connection, table)
+                    else:
+                        existing_indexes = [index['name'] for index in inspector.get_indexes(table.name)]
+                        migrate_table(connection, table, existing_columns, existing_indexes)
+
+            trans.commit()
+            print("Migration completed successfully!")
+
+        except Exception as e:
+            print(f"Migration failed: {e}")
+            trans.rollback()
+            raise
+
+def main():
+    """Main migration function"""
+    try:
+        migrate_database()
+        print("✅ Database migration completed successfully!")
+        print("\nPlaintext tokens have been replaced by their SHA-256 hashes.")
+        print("Issued tokens keep working because lookups hash the presented token.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,62 @@ chat management, and related entities.
 """
 
 import enum
-from datetime import datetime, timezone
 from typing import List
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON, Enum
-from sqlalchemy.orm import relationship, Mapped
+import orjson
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index, LargeBinary
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import relationship, Mapped, validates, deferred
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import TypeDecorator
 
 from database import Base
 
+class utcnow(FunctionElement):
+    """
+    Current UTC time, evaluated by the database.
+    
+    Used as the insert/update default for timestamp columns so the value is
+    rendered into the statement instead of being built in Python per row.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _compile_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, "postgresql")
+def _compile_utcnow_postgresql(element, compiler, **kw):
+    # The columns are timezone-naive UTC; don't depend on the session time zone
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow, "sqlite")
+def _compile_utcnow_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP has whole-second resolution on SQLite; keep milliseconds for ordering
+    return "STRFTIME('%Y-%m-%d %H:%M:%f', 'now')"
+
+class ORJSON(TypeDecorator):
+    """
+    JSON stored as compact text, serialized with orjson.
+    
+    Drop-in replacement for the generic JSON type on columns that are only
+    read and written whole, never queried into.
+    """
+    impl = Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def process_result_value(self, value, dialect):
+        # Native json columns (e.g. PostgreSQL) may already be decoded by the driver
+        if value is None or not isinstance(value, (str, bytes)):
+            return value
+        return orjson.loads(value)
+
 class User(Base):
     """
     User model for authentication and profile management.
@@ -22,8 +70,10 @@ class User(Base):
     and authentication-related data.
     """
     __tablename__ = "users"
+    # Timestamps set by the database come back with RETURNING
+    __mapper_args__ = {"eager_defaults": True}
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, index=True, nullable=False)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
@@ -32,13 +82,14 @@ class User(Base):
     is_verified = Column(Boolean, default=False)
     failed_login_attempts = Column(Integer, default=0)
     locked_until = Column(DateTime, nullable=True)
-    password_changed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     last_login_at = Column(DateTime, nullable=True)
     mfa_enabled = Column(Boolean, default=False)
-    mfa_secret = Column(String, nullable=True)
-    backup_codes = Column(JSON, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    # Cold columns, loaded only when accessed; login and /me never read them
+    password_changed_at = deferred(Column(DateTime, default=utcnow()))
+    mfa_secret = deferred(Column(String, nullable=True))
+    backup_codes = deferred(Column(ORJSON, nullable=True))
+    created_at = Column(DateTime, default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
     
     refresh_tokens = relationship("RefreshToken", back_populates="user")
     password_history = relationship("PasswordHistory", back_populates="user")
@@ -46,49 +97,57 @@ class User(Base):
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    token = Column(Text, nullable=False, index=True)
+    __table_args__ = (
+        # Active tokens per user, and expired-token cleanup
+        Index("ix_refresh_tokens_user_revoked", "user_id", "revoked"),
+        Index("ix_refresh_tokens_expires", "expires_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(LargeBinary(32), nullable=False, unique=True, index=True)  # SHA-256 of the issued token
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     expires_at = Column(DateTime, nullable=False)
     revoked = Column(Boolean, default=False)
     ip_address = Column(String, nullable=True)
     user_agent = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow())
     
     user = relationship("User", back_populates="refresh_tokens")
 
 class PasswordHistory(Base):
     __tablename__ = "password_history"
+    __table_args__ = (
+        Index("ix_password_history_user_created", "user_id", "created_at"),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     hashed_password = Column(String, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow())
     
     user = relationship("User", back_populates="password_history")
 
 class EmailVerification(Base):
     __tablename__ = "email_verifications"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    token = Column(String, unique=True, nullable=False)
+    token_hash = Column(LargeBinary(32), unique=True, nullable=False)  # SHA-256 of the issued token
     expires_at = Column(DateTime, nullable=False)
     used = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow())
     
     user = relationship("User", back_populates="email_verifications")
 
 class PasswordReset(Base):
     __tablename__ = "password_resets"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    token = Column(String, unique=True, nullable=False)
+    token_hash = Column(LargeBinary(32), unique=True, nullable=False)  # SHA-256 of the issued token
     expires_at = Column(DateTime, nullable=False)
     used = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow())
     
     user = relationship("User", back_populates="password_resets")
 
@@ -100,18 +159,29 @@ class AIMode(enum.Enum):
 
 class Chat(Base):
     __tablename__ = "chats"
+    __table_args__ = (
+        # Matches the chat list filter and its pinned/updated_at ordering
+        Index("ix_chats_user_archived_pinned_updated", "user_id", "is_archived", "is_pinned", "updated_at"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False)
-    mode = Column(Enum(AIMode), nullable=False)
+    mode = Column(String(32), nullable=False)  # AIMode value
     is_pinned = Column(Boolean, default=False)
     is_archived = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    message_count = Column(Integer, default=0, nullable=False)  # Maintained by create_message
+    created_at = Column(DateTime, default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
     
     user = relationship("User", back_populates="chats")
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
+    
+    @validates("mode")
+    def validate_mode(self, key, value):
+        # Stored as a plain string; validated once on write instead of coerced on every read
+        return AIMode(value).value
 
 class MessageRole(enum.Enum):
     USER = "user"
@@ -120,27 +190,44 @@ class MessageRole(enum.Enum):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_chat_created", "chat_id", "created_at"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
-    role = Column(Enum(MessageRole), nullable=False)
+    role = Column(String(32), nullable=False)  # MessageRole value
     content = Column(Text, nullable=False)
-    message_metadata = Column(JSON, nullable=True)  # For storing images, processing status, etc.
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    message_metadata = Column(ORJSON, nullable=True)  # For storing images, processing status, etc.
+    created_at = Column(DateTime, default=utcnow())
     
     chat = relationship("Chat", back_populates="messages")
+    
+    @validates("role")
+    def validate_role(self, key, value):
+        return MessageRole(value).value
 
 class ChatSettings(Base):
     __tablename__ = "chat_settings"
+    __table_args__ = (
+        # One settings row per user and mode
+        Index("ix_chat_settings_user_mode", "user_id", "mode", unique=True),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    mode = Column(Enum(AIMode), nullable=False)
-    settings = Column(JSON, nullable=False)  # Mode-specific settings
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    mode = Column(String(32), nullable=False)  # AIMode value
+    settings = Column(ORJSON, nullable=False)  # Mode-specific settings
+    created_at = Column(DateTime, default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
     
     user = relationship("User", back_populates="chat_settings")
+    
+    @validates("mode")
+    def validate_mode(self, key, value):
+        return AIMode(value).value
 
 User.chats = relationship("Chat", back_populates="user")
 User.chat_settings = relationship("ChatSettings", back_populates="user")
\ No newline at end of file
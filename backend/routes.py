@@ -1,32 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi import Limiter
 from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+import asyncio
+import hmac
 import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
 
+from config import settings
 from database import get_db
-from models import User
+from models import User, PasswordReset, EmailVerification
 from schemas import UserCreate, UserLogin, UserResponse, Token, TokenRefresh, Message, EmailData, PasswordResetRequest, ChangePasswordRequest
 from auth import (
-    authenticate_user, create_user, get_user_by_email,
-    create_access_token, create_refresh_token, verify_refresh_token,
+    authenticate_user_with_row, create_user, get_cached_user_by_email, get_cached_user_by_id,
+    load_credential_columns,
+    create_access_token, create_refresh_token, consume_refresh_token,
     revoke_refresh_token, get_current_user, is_account_locked,
     increment_failed_login, reset_failed_login_attempts,
     create_email_verification, create_password_reset, check_password_history,
-    add_password_to_history, get_password_hash, verify_password
+    update_user_password, get_password_hash_async, verify_password_async,
+    invalidate_user_cache, hash_token
 )
 
+UTC = timezone.utc
+FORGOT_PASSWORD_MIN_RESPONSE_SECONDS = settings.forgot_password_min_response_ms / 1000
+
 # Rate limiting setup
-limiter = Limiter(key_func=get_remote_address)
+# Limits fall back to process memory if the shared storage is unreachable
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.rate_limit_storage_uri,
+    in_memory_fallback_enabled=True
+)
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 @limiter.limit("3/minute")
 async def register(request: Request, user: UserCreate, db: Session = Depends(get_db)):
     # Check if user already exists
-    if get_user_by_email(db, user.email):
+    if await run_in_threadpool(get_cached_user_by_email, db, user.email):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Email already registered"
@@ -34,27 +50,30 @@ async def register(request: Request, user: UserCreate, db: Session = Depends(get
     
     # Create new user
     try:
-        db_user = create_user(db, user.email, user.first_name, user.last_name, user.password)
-        
-        # Create email verification token
-        verification_token = create_email_verification(db, db_user.id)
-        
-        # TODO: Send verification email
-        logging.info(f"User {db_user.email} registered. Verification token: {verification_token}")
-        
-        return db_user
+        hashed_password = await get_password_hash_async(user.password)
+        return await run_in_threadpool(_register_user, db, user, hashed_password)
     except Exception as e:
-        logging.error(f"Error creating user: {e}")
+        logging.error("Error creating user: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create user"
         )
 
+def _register_user(db: Session, user: UserCreate, hashed_password: str) -> User:
+    db_user = create_user(db, user.email, user.first_name, user.last_name, hashed_password)
+    
+    # Create email verification token
+    # TODO: Send verification email with the returned token; it must not be logged
+    create_email_verification(db, db_user.id)
+    logging.info("User %s registered", db_user.email)
+    
+    return db_user
+
 @router.post("/login", response_model=Token)
 @limiter.limit("10/minute")
 async def login(request: Request, user: UserLogin, db: Session = Depends(get_db)):
     # Get user by email first
-    db_user = get_user_by_email(db, user.email)
+    db_user = await run_in_threadpool(_get_login_user, db, user.email)
     
     # Check if account is locked
     if db_user and is_account_locked(db_user):
@@ -63,13 +82,13 @@ async def login(request: Request, user: UserLogin, db: Session = Depends(get_db)
             detail="Account is temporarily locked due to multiple failed login attempts"
         )
     
-    # Authenticate user
-    authenticated_user = authenticate_user(db, user.email, user.password)
+    # Authenticate against the row fetched above
+    authenticated_user = await authenticate_user_with_row(db_user, user.password)
     
     if not authenticated_user:
         # Increment failed login attempts if user exists
         if db_user:
-            increment_failed_login(db, db_user)
+            await run_in_threadpool(increment_failed_login, db, db_user)
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -82,12 +101,9 @@ async def login(request: Request, user: UserLogin, db: Session = Depends(get_db)
             detail="Account is disabled"
         )
     
-    # Reset failed login attempts on successful login
-    reset_failed_login_attempts(db, authenticated_user)
-    
     # Create tokens
     access_token = create_access_token(data={"sub": str(authenticated_user.id)})
-    refresh_token = create_refresh_token(authenticated_user.id, db, request)
+    refresh_token = await run_in_threadpool(_record_login, db, authenticated_user, request)
     
     return {
         "access_token": access_token,
@@ -95,11 +111,23 @@ async def login(request: Request, user: UserLogin, db: Session = Depends(get_db)
         "token_type": "bearer"
     }
 
+def _get_login_user(db: Session, email: str) -> Optional[User]:
+    user = get_cached_user_by_email(db, email)
+    if user:
+        load_credential_columns(db, user)
+    return user
+
+def _record_login(db: Session, user: User, request: Request) -> str:
+    # Reset failed login attempts on successful login
+    reset_failed_login_attempts(db, user)
+    return create_refresh_token(user.id, db, request)
+
 @router.post("/refresh", response_model=Token)
 @limiter.limit("20/minute")
-async def refresh_token(request: Request, token_data: TokenRefresh, db: Session = Depends(get_db)):
-    # Verify refresh token
-    user = verify_refresh_token(db, token_data.refresh_token)
+def refresh_token(request: Request, token_data: TokenRefresh, db: Session = Depends(get_db)):
+    # Revoke the old refresh token; committed together with its replacement
+    user_id = consume_refresh_token(db, token_data.refresh_token)
+    user = get_cached_user_by_id(db, user_id) if user_id is not None else None
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -118,9 +146,6 @@ async def refresh_token(request: Request, token_data: TokenRefresh, db: Session
     # Create new refresh token for better security (token rotation)
     new_refresh_token = create_refresh_token(user.id, db, request)
     
-    # Revoke old refresh token
-    revoke_refresh_token(db, token_data.refresh_token)
-    
     return {
         "access_token": access_token,
         "refresh_token": new_refresh_token,
@@ -128,7 +153,7 @@ async def refresh_token(request: Request, token_data: TokenRefresh, db: Session
     }
 
 @router.post("/logout", response_model=Message)
-async def logout(token_data: TokenRefresh, db: Session = Depends(get_db)):
+def logout(token_data: TokenRefresh, db: Session = Depends(get_db)):
     # Revoke refresh token
     success = revoke_refresh_token(db, token_data.refresh_token)
     if not success:
@@ -146,17 +171,24 @@ async def get_current_user_info(current_user = Depends(get_current_user)):
 @router.post("/forgot-password", response_model=Message)
 @limiter.limit("3/minute")
 async def forgot_password(request: Request, email_data: EmailData, db: Session = Depends(get_db)):
-    email = email_data.email
+    started = time.monotonic()
+    await run_in_threadpool(_request_password_reset, db, email_data.email)
     
-    user = get_user_by_email(db, email)
-    if user:
-        reset_token = create_password_reset(db, user.id)
-        # TODO: Send password reset email
-        logging.info(f"Password reset requested for {email}. Token: {reset_token}")
+    # Pad every response to the same duration so timing does not reveal registered emails
+    remaining = FORGOT_PASSWORD_MIN_RESPONSE_SECONDS - (time.monotonic() - started)
+    if remaining > 0:
+        await asyncio.sleep(remaining)
     
     # Always return success to prevent email enumeration
     return {"message": "If your email is registered, you will receive a password reset link"}
 
+def _request_password_reset(db: Session, email: str):
+    user = get_cached_user_by_email(db, email)
+    if user:
+        # TODO: Send password reset email with the returned token; it must not be logged
+        create_password_reset(db, user.id)
+        logging.info("Password reset requested for %s", email)
+
 @router.post("/reset-password", response_model=Message)
 @limiter.limit("5/minute")
 async def reset_password(request: Request, reset_data: PasswordResetRequest, db: Session = Depends(get_db)):
@@ -164,14 +196,7 @@ async def reset_password(request: Request, reset_data: PasswordResetRequest, db:
     new_password = reset_data.new_password
     
     # Find valid reset token
-    from models import PasswordReset
-    from datetime import datetime, timezone
-    
-    reset_record = db.query(PasswordReset).filter(
-        PasswordReset.token == token,
-        PasswordReset.used == False,
-        PasswordReset.expires_at > datetime.now(timezone.utc)
-    ).first()
+    reset_record = await run_in_threadpool(_get_valid_password_reset, db, token)
     
     if not reset_record:
         raise HTTPException(
@@ -179,50 +204,83 @@ async def reset_password(request: Request, reset_data: PasswordResetRequest, db:
             detail="Invalid or expired reset token"
         )
     
-    user = reset_record.user
+    user_id = reset_record.user_id
     
     # Check password history
-    if not check_password_history(db, user.id, new_password):
+    if not await check_password_history(db, user_id, new_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot reuse recent passwords"
         )
     
-    # Update password
-    hashed_password = get_password_hash(new_password)
-    user.hashed_password = hashed_password
-    user.password_changed_at = datetime.now(timezone.utc)
+    hashed_password = await get_password_hash_async(new_password)
     
-    # Add to password history
-    add_password_to_history(db, user.id, hashed_password)
-    
-    # Mark reset token as used
-    reset_record.used = True
-    db.commit()
+    if not await run_in_threadpool(_apply_password_reset, db, reset_record.id, user_id, hashed_password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired reset token"
+        )
     
     return {"message": "Password reset successfully"}
 
+def _get_valid_password_reset(db: Session, token: str) -> Optional[PasswordReset]:
+    return db.execute(
+        select(PasswordReset).where(
+            PasswordReset.token_hash == hash_token(token),
+            PasswordReset.used == False,
+            PasswordReset.expires_at > datetime.now(UTC)
+        ).limit(1)
+    ).scalar_one_or_none()
+
+def _apply_password_reset(db: Session, reset_id: int, user_id: int, hashed_password: str) -> bool:
+    # Consume the token first, then update the password and history in the same
+    # transaction. Of concurrent requests with this token only one still matches
+    # used == False; the others change nothing.
+    consumed_user_id = db.execute(
+        update(PasswordReset)
+        .where(PasswordReset.id == reset_id, PasswordReset.used == False)
+        .values(used=True)
+        .returning(PasswordReset.user_id),
+        execution_options={"synchronize_session": False}
+    ).scalar_one_or_none()
+    
+    if consumed_user_id is None:
+        db.rollback()
+        return False
+    
+    update_user_password(db, user_id, hashed_password)
+    db.commit()
+    invalidate_user_cache(user_id)
+    return True
+
 @router.post("/verify-email", response_model=Message)
-async def verify_email(token: str, db: Session = Depends(get_db)):
-    from models import EmailVerification
-    from datetime import datetime, timezone
-    
-    verification = db.query(EmailVerification).filter(
-        EmailVerification.token == token,
-        EmailVerification.used == False,
-        EmailVerification.expires_at > datetime.now(timezone.utc)
-    ).first()
+def verify_email(token: str, db: Session = Depends(get_db)):
+    # Consume the token and learn its user in one statement; concurrent requests
+    # with the same token cannot both match the used == False condition
+    user_id = db.execute(
+        update(EmailVerification)
+        .where(
+            EmailVerification.token_hash == hash_token(token),
+            EmailVerification.used == False,
+            EmailVerification.expires_at > datetime.now(UTC)
+        )
+        .values(used=True)
+        .returning(EmailVerification.user_id),
+        execution_options={"synchronize_session": False}
+    ).scalar_one_or_none()
     
-    if not verification:
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired verification token"
         )
     
-    user = verification.user
-    user.is_verified = True
-    verification.used = True
+    db.execute(
+        update(User).where(User.id == user_id).values(is_verified=True),
+        execution_options={"synchronize_session": False}
+    )
     db.commit()
+    invalidate_user_cache(user_id)
     
     return {"message": "Email verified successfully"}
 
@@ -235,37 +293,37 @@ async def change_password(
     db: Session = Depends(get_db)
 ):
     # Verify current password
-    if not verify_password(change_data.current_password, current_user.hashed_password):
+    await run_in_threadpool(load_credential_columns, db, current_user)
+    if not await verify_password_async(change_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
-    # Check password history
-    if not check_password_history(db, current_user.id, change_data.new_password):
+    # Check if new password is same as current; the current one was just verified,
+    # so comparing the plaintexts is enough and saves a bcrypt round
+    if hmac.compare_digest(change_data.new_password.encode(), change_data.current_password.encode()):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot reuse recent passwords"
+            detail="New password cannot be the same as current password"
         )
     
-    # Check if new password is same as current
-    if verify_password(change_data.new_password, current_user.hashed_password):
+    # Check password history
+    if not await check_password_history(db, current_user.id, change_data.new_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="New password cannot be the same as current password"
+            detail="Cannot reuse recent passwords"
         )
     
-    # Update password
-    from datetime import datetime, timezone
-    hashed_password = get_password_hash(change_data.new_password)
-    current_user.hashed_password = hashed_password
-    current_user.password_changed_at = datetime.now(timezone.utc)
-    
-    # Add to password history
-    add_password_to_history(db, current_user.id, hashed_password)
-    
-    db.commit()
+    # Update password and record it in history in one transaction
+    hashed_password = await get_password_hash_async(change_data.new_password)
+    await run_in_threadpool(_save_new_password, db, current_user.id, hashed_password)
     
     return {"message": "Password changed successfully"}
 
+def _save_new_password(db: Session, user_id: int, hashed_password: str):
+    update_user_password(db, user_id, hashed_password)
+    db.commit()
+    invalidate_user_cache(user_id)
+
 # Exception handlers are added to the main app, not router
\ No newline at end of file
@@ -1,9 +1,56 @@
-from pydantic import BaseModel, EmailStr, field_validator, Field
+from pydantic import BaseModel, EmailStr, field_validator, model_validator, Field
+from pydantic_core import PydanticCustomError
 from typing import Optional, List, Annotated, Dict, Any
 from datetime import datetime
 from enum import Enum
+import hmac
 import re
 
+# Password policy patterns, compiled once at import.
+# Each group of _STRENGTH_RE is one required character class, in message order.
+_STRENGTH_RE = re.compile(r'([A-Z])|([a-z])|([0-9])|([!@#$%^&*(),.?":{}|<>])')
+_STRENGTH_MESSAGES = [
+    'at least one uppercase letter',
+    'at least one lowercase letter',
+    'at least one number',
+    'at least one special character'
+]
+_ALL_STRENGTH_CLASSES = (1 << len(_STRENGTH_MESSAGES)) - 1
+_REPEAT_RE = re.compile(r'(.)\1{3,}')
+
+# Obvious sequences are found with one scan of the password, however many are listed
+_WEAK_SEQUENCES = ['123456789', 'abcdefgh', 'qwertyuiop']
+_WEAK_SEQUENCE_RE = re.compile('|'.join(map(re.escape, _WEAK_SEQUENCES)))
+_VERY_WEAK_PASSWORDS = frozenset(['password', 'password123', 'admin', 'admin123', 'letmein', '12345678'])
+
+def _validate_password_strength(v: str) -> None:
+    """Enforce the length and character class rules shared by every password field"""
+    if len(v) < 12:
+        raise ValueError('Password must be at least 12 characters long')
+    
+    # One scan collects a bit per character class seen
+    found = 0
+    for match in _STRENGTH_RE.finditer(v):
+        found |= 1 << (match.lastindex - 1)
+        if found == _ALL_STRENGTH_CLASSES:
+            return
+    
+    for bit, message in enumerate(_STRENGTH_MESSAGES):
+        if not found & (1 << bit):
+            raise ValueError(f'Password must contain {message}')
+
+# Emails that are only looked up, never stored, get a cheap shape check instead of
+# full EmailStr validation; registration still goes through EmailStr
+_EMAIL_PATTERN = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+
+def _normalize_email(v):
+    """Strip and lowercase the domain, matching how EmailStr normalized the stored email"""
+    if isinstance(v, str):
+        local, _, domain = v.strip().rpartition('@')
+        if local:
+            return f'{local}@{domain.lower()}'
+    return v
+
 class UserBase(BaseModel):
     email: EmailStr
     first_name: Annotated[str, Field(min_length=1, max_length=50, pattern=r'^[a-zA-Z\s\-\']+$')]
@@ -17,40 +64,24 @@ class UserCreate(UserBase):
     
     @field_validator('password')
     def validate_password(cls, v):
-        if len(v) < 12:
-            raise ValueError('Password must be at least 12 characters long')
-        
-        strength_checks = [
-            (r'[A-Z]', 'at least one uppercase letter'),
-            (r'[a-z]', 'at least one lowercase letter'),
-            (r'[0-9]', 'at least one number'),
-            (r'[!@#$%^&*(),.?":{}|<>]', 'at least one special character')
-        ]
-        
-        for pattern, message in strength_checks:
-            if not re.search(pattern, v):
-                raise ValueError(f'Password must contain {message}')
+        _validate_password_strength(v)
         
         # Check for common weak patterns - but be more reasonable
-        if re.search(r'(.)\1{3,}', v):  # More than 3 repeated characters
+        if _REPEAT_RE.search(v):  # More than 3 repeated characters
             raise ValueError('Password cannot contain too many repeated characters')
         
         # Check for very common weak passwords (exact matches or very obvious patterns)
-        weak_patterns = ['123456789', 'abcdefgh', 'qwertyuiop']
-        very_weak_passwords = ['password', 'password123', 'admin', 'admin123', 'letmein', '12345678']
-        
         lower_password = v.lower()
-        if any(pattern in lower_password for pattern in weak_patterns) or lower_password in very_weak_passwords:
+        if _WEAK_SEQUENCE_RE.search(lower_password) or lower_password in _VERY_WEAK_PASSWORDS:
             raise ValueError('Password is too common or contains obvious sequences')
             
         return v
     
-    @field_validator('confirm_password')
-    def passwords_match(cls, v, info):
-        password = info.data.get('password')
-        if password is not None and v != password:
-            raise ValueError('Passwords do not match')
-        return v
+    @model_validator(mode='after')
+    def passwords_match(self):
+        if not hmac.compare_digest(self.confirm_password.encode(), self.password.encode()):
+            raise PydanticCustomError('password_mismatch', 'Passwords do not match')
+        return self
     
     @field_validator('terms_accepted')
     def terms_must_be_accepted(cls, v):
@@ -59,12 +90,17 @@ class UserCreate(UserBase):
         return v
 
 class UserLogin(BaseModel):
-    email: EmailStr
+    email: Annotated[str, Field(max_length=254, pattern=_EMAIL_PATTERN)]
     password: str
     remember_me: bool = False
     mfa_code: Optional[str] = None
+    
+    @field_validator('email', mode='before')
+    def normalize_email(cls, v):
+        return _normalize_email(v)
 
 class UserResponse(UserBase):
+    email: str  # Already validated when the user registered
     id: int
     is_active: bool
     is_verified: bool
@@ -92,7 +128,11 @@ class PasswordStrength(BaseModel):
     feedback: List[str]
 
 class EmailData(BaseModel):
-    email: EmailStr
+    email: Annotated[str, Field(max_length=254, pattern=_EMAIL_PATTERN)]
+    
+    @field_validator('email', mode='before')
+    def normalize_email(cls, v):
+        return _normalize_email(v)
 
 class PasswordResetRequest(BaseModel):
     token: str
@@ -100,19 +140,7 @@ class PasswordResetRequest(BaseModel):
     
     @field_validator('new_password')
     def validate_password(cls, v):
-        if len(v) < 12:
-            raise ValueError('Password must be at least 12 characters long')
-        
-        strength_checks = [
-            (r'[A-Z]', 'at least one uppercase letter'),
-            (r'[a-z]', 'at least one lowercase letter'),
-            (r'[0-9]', 'at least one number'),
-            (r'[!@#$%^&*(),.?":{}|<>]', 'at least one special character')
-        ]
-        
-        for pattern, message in strength_checks:
-            if not re.search(pattern, v):
-                raise ValueError(f'Password must contain {message}')
+        _validate_password_strength(v)
         
         return v
 
@@ -123,28 +151,15 @@ class ChangePasswordRequest(BaseModel):
     
     @field_validator('new_password')
     def validate_password(cls, v):
-        if len(v) < 12:
-            raise ValueError('Password must be at least 12 characters long')
-        
-        strength_checks = [
-            (r'[A-Z]', 'at least one uppercase letter'),
-            (r'[a-z]', 'at least one lowercase letter'),
-            (r'[0-9]', 'at least one number'),
-            (r'[!@#$%^&*(),.?":{}|<>]', 'at least one special character')
-        ]
-        
-        for pattern, message in strength_checks:
-            if not re.search(pattern, v):
-                raise ValueError(f'Password must contain {message}')
+        _validate_password_strength(v)
         
         return v
     
-    @field_validator('confirm_password')
-    def passwords_match(cls, v, info):
-        new_password = info.data.get('new_password')
-        if new_password is not None and v != new_password:
-            raise ValueError('Passwords do not match')
-        return v
+    @model_validator(mode='after')
+    def passwords_match(self):
+        if not hmac.compare_digest(self.confirm_password.encode(), self.new_password.encode()):
+            raise PydanticCustomError('password_mismatch', 'Passwords do not match')
+        return self
 
 class AIModeEnum(str, Enum):
     SIMILAR_QUESTIONS = "similar_questions"